@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import asyncio
-import fire
 from multinpainter import __version__
 from .multinpainter import Multinpainter_OpenAI
 from typing import Optional
@@ -11,6 +10,26 @@ def get_inpainter(*args, **kwargs) -> Multinpainter_OpenAI:
     return Multinpainter_OpenAI(*args, **kwargs)
 
 
+async def inpaint_async(**kwargs) -> str:
+    """
+    Async core of :func:`inpaint`. The CLI wrapper runs it via asyncio.run;
+    callers already inside an event loop (tests, embedding applications)
+    await it directly. Takes the same keyword arguments as `get_inpainter`.
+    """
+    inpainter = get_inpainter(**kwargs)
+    await inpainter.inpaint()
+    return inpainter.out_path
+
+
+async def describe_async(**kwargs) -> str:
+    """
+    Async core of :func:`describe`; see :func:`inpaint_async`.
+    """
+    inpainter = get_inpainter(**kwargs)
+    await inpainter.describe_image()
+    return inpainter.prompt
+
+
 def inpaint(
     image: str,
     output: str,
@@ -25,6 +44,7 @@ def inpaint(
     openai_api_key: Optional[str] = None,
     hf_api_key: Optional[str] = None,
     prompt_model: str = None,
+    max_concurrency: int = 5,
     *args, **kwargs,
 ) -> str:
     """
@@ -44,27 +64,29 @@ def inpaint(
         openai_api_key (str, optional): Your OpenAI API key, defaults to the OPENAI_API_KEY environment variable.
         hf_api_key (str, optional): Your Huggingface API key, defaults to the HUGGINGFACEHUB_API_TOKEN env variable.
         prompt_model (str, optional): The Huggingface model to describe image. Defaults to "Salesforce/blip2-opt-2.7b".
+        max_concurrency (int, optional): Maximum number of inpainting API requests in flight at once. Defaults to 5.
     Returns:
         str: The path to the output image file.
     """
 
-    inpainter = get_inpainter(
-        image_path=image,
-        out_path=output,
-        out_width=width,
-        out_height=height,
-        prompt=prompt,
-        fallback=fallback,
-        step=step,
-        square=square,
-        humans=humans,
-        verbose=verbose,
-        openai_api_key=openai_api_key,
-        hf_api_key=hf_api_key,
-        prompt_model=prompt_model,
+    return asyncio.run(
+        inpaint_async(
+            image_path=image,
+            out_path=output,
+            out_width=width,
+            out_height=height,
+            prompt=prompt,
+            fallback=fallback,
+            step=step,
+            square=square,
+            humans=humans,
+            verbose=verbose,
+            openai_api_key=openai_api_key,
+            hf_api_key=hf_api_key,
+            prompt_model=prompt_model,
+            max_concurrency=max_concurrency,
+        )
     )
-    asyncio.run(inpainter.inpaint())
-    return inpainter.out_path
 
 
 def describe(
@@ -84,24 +106,29 @@ def describe(
         str: The path to the output image file.
     """
 
-    inpainter = get_inpainter(
-        image_path=image,
-        hf_api_key=hf_api_key,
-        prompt_model=prompt_model,
+    return asyncio.run(
+        describe_async(
+            image_path=image,
+            hf_api_key=hf_api_key,
+            prompt_model=prompt_model,
+        )
     )
-    asyncio.run(inpainter.describe_image())
-    return inpainter.prompt
+
+
+# Built once at module scope; Fire reflects over this mapping on startup.
+_COMPONENTS = {
+    "inpaint": inpaint,
+    "describe": describe,
+}
 
 
 def cli():
+    # Deferred: fire pulls in inspect & friends, which costs ~150ms that
+    # `import multinpainter` alone should not pay.
+    import fire
+
     fire.core.Display = lambda lines, out: print(*lines, file=out)
-    fire.Fire(
-        {
-            "inpaint": inpaint,
-            "describe": describe,
-        },
-        name="multinpainter-py",
-    )
+    fire.Fire(_COMPONENTS, name="multinpainter-py")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,9 @@
+import asyncio
 import base64
+import functools
 import io
 import re
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
-import aiohttp
 import httpx
 import numpy as np
 import openai
@@ -14,6 +15,7 @@ async def describe_image_hf(
     image: Image.Image,
     prompt_model: str,
     hf_api_key: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
 ) -> str:
     headers = {"Authorization": f"Bearer {hf_api_key}"}
     api_url = f"https://api-inference.huggingface.co/models/{prompt_model}"
@@ -22,71 +24,210 @@ async def describe_image_hf(
     async def post(
         api_url: str, image: bytes, headers: Dict, wait_for_model: bool = True
     ) -> Any:
-        async with aiohttp.ClientSession() as session:
-            payload: Dict[str, str] = {
-                "inputs": {"image": base64.b64encode(image).decode("utf-8")},
-                "options": {"wait_for_model": wait_for_model},
-            }
-            async with session.post(api_url, headers=headers, json=payload) as response:
-                if not response.ok:
-                    print(response)
-                    print(headers)
-                inference = await response.json()
-        return inference
+        payload: Dict[str, Any] = {
+            "inputs": {"image": base64.b64encode(image).decode("utf-8")},
+            "options": {"wait_for_model": wait_for_model},
+        }
+        if client is not None:
+            response = await client.post(api_url, headers=headers, json=payload)
+        else:
+            async with httpx.AsyncClient() as own_client:
+                response = await own_client.post(api_url, headers=headers, json=payload)
+        if response.is_error:
+            print(response)
+            print(headers)
+        return response.json()
 
     inference = await post(api_url, png, headers=headers)
     pattern = re.compile(r'^Level \d+: ')
     description = inference[0].get("generated_text", "").strip()
     return re.sub(pattern, '', description)
 
-# 2. detect_humans
-def detect_humans_yolo(image: Image.Image) -> List[Tuple[int, int, int, int]]:
+@functools.lru_cache(maxsize=1)
+def _get_yolo():
+    # Constructing YOLO reloads the weights and re-initializes the backend
+    # every time; one cached instance serves every painter in the process.
     from ultralytics import YOLO
 
-    boxes = []
     model = YOLO("yolov8n.pt")
-    model.classes = [0]
-    model.conf = 0.6
-    detection = model.predict(image)
-
-    for box_obj in detection:
-        box = box_obj.boxes.xyxy.tolist()[0]
-        boxes.append(
-            (int(box[0] - 0.5), int(box[1] - 0.5), int(box[2] + 0.5), int(box[3] + 0.5))
+    # Dummy inference pays the one-off cold-start cost (weight load, backend
+    # autotune) so real predictions run at steady-state latency.
+    model.predict(np.zeros((320, 320, 3), dtype=np.uint8), verbose=False)
+    return model
+
+
+@functools.lru_cache(maxsize=1)
+def _get_dlib_detector():
+    import dlib
+
+    return dlib.get_frontal_face_detector()
+
+
+# YOLOv8n's canonical input edge; predictions on larger frames just pay
+# extra tensor-preparation bandwidth for the same letterboxed inference.
+YOLO_MAX_EDGE = 640
+
+
+# 2. detect_humans
+def detect_humans_yolov8(image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    height, width = image.shape[:2]
+    scale = min(1.0, YOLO_MAX_EDGE / max(width, height))
+    if scale < 1.0:
+        image = np.asarray(
+            Image.fromarray(image).resize(
+                (round(width * scale), round(height * scale)), Image.LANCZOS
+            )
         )
+    results = _get_yolo().predict(image, classes=[0], conf=0.6, verbose=False)[0]
 
-    return sorted(boxes, key=lambda box: box[0])
+    # Pull every box in one tensor->ndarray conversion; the old per-Results
+    # loop took xyxy.tolist()[0] and silently dropped all but the first human.
+    xyxy = results.boxes.xyxy.cpu().numpy()
+    if not len(xyxy):
+        return []
+    xyxy = np.round(xyxy / scale).astype(np.int32)
+    xyxy = xyxy[np.argsort(xyxy[:, 0])]
+    return [tuple(int(coord) for coord in box) for box in xyxy]
 
 
-# 3. detect_faces
-def detect_faces_dlib(image: Image.Image) -> Optional[Any]:
-    import dlib
+def _tile_origins(size: int, tile: int, stride: int) -> List[int]:
+    if size <= tile:
+        return [0]
+    origins = list(range(0, size - tile, stride))
+    origins.append(size - tile)
+    return origins
+
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5) -> np.ndarray:
+    """
+    Greedy non-maximum suppression over (N, 4) float boxes; returns the
+    indices of the kept boxes, highest score first.
+    """
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        x0 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        y0 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        x1 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        y1 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.maximum(0, x1 - x0) * np.maximum(0, y1 - y0)
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
 
-    face_detector = dlib.get_frontal_face_detector()
-    faces = face_detector(np.array(image.convert("RGB")), 1)
-    return faces[0] if faces and len(faces) else None
+
+def detect_humans_yolov8_tiled(
+    image: np.ndarray, tile: int = YOLO_MAX_EDGE, overlap: float = 0.3
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Accuracy-oriented variant of `detect_humans_yolov8` for large frames:
+    instead of downscaling, the image is split into overlapping native-size
+    tiles that run as one batched predict call, and boxes from overlapping
+    tiles are merged with NMS in global coordinates. Catches small humans a
+    downscaled single pass misses; pass it as `func_detect` to
+    `detect_humans` together with `full_resolution=True` when that matters
+    more than speed - without it, detect_humans hands detectors pixels
+    already capped at 1024px on the long edge, defeating the tiling.
+    """
+    height, width = image.shape[:2]
+    if max(height, width) <= tile:
+        return detect_humans_yolov8(image)
+
+    stride = max(1, int(tile * (1.0 - overlap)))
+    origins = [
+        (x, y)
+        for y in _tile_origins(height, tile, stride)
+        for x in _tile_origins(width, tile, stride)
+    ]
+    tiles = [image[y : y + tile, x : x + tile] for x, y in origins]
+    # One batched call: a single launch for all tiles instead of N round
+    # trips through the predictor.
+    results = _get_yolo().predict(
+        tiles, classes=[0], conf=0.6, verbose=False, batch=len(tiles)
+    )
+
+    all_boxes = []
+    all_scores = []
+    for (tx, ty), result in zip(origins, results):
+        xyxy = result.boxes.xyxy.cpu().numpy()
+        if not len(xyxy):
+            continue
+        xyxy = xyxy + np.array([tx, ty, tx, ty], dtype=xyxy.dtype)
+        all_boxes.append(xyxy)
+        all_scores.append(result.boxes.conf.cpu().numpy())
+    if not all_boxes:
+        return []
+
+    boxes = np.concatenate(all_boxes)
+    scores = np.concatenate(all_scores)
+    boxes = np.round(boxes[_nms(boxes, scores)]).astype(np.int32)
+    boxes = boxes[np.argsort(boxes[:, 0])]
+    return [tuple(int(coord) for coord in box) for box in boxes]
+
+
+# 3. detect_faces
+def detect_faces_dlib(image: np.ndarray) -> Optional[List[Tuple[int, int, int, int]]]:
+    faces = _get_dlib_detector()(image, 1)
+    if not faces or not len(faces):
+        return None
+    # Plain (x0, y0, x1, y1) tuples instead of dlib rectangle objects, so
+    # callers can rescale and unpack them without importing dlib.
+    return [(face.left(), face.top(), face.right(), face.bottom()) for face in faces]
 
 
 # 4. inpaint_square
 async def inpaint_square_openai(
-    image: Image.Image,
+    image: Union[Image.Image, bytes],
     prompt: str,
     square_size: Tuple[int, int],
     openai_api_key: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    oai: Optional["openai.AsyncOpenAI"] = None,
 ) -> Image.Image:
-    openai.api_key = openai_api_key
-    png = image_to_png(image)
+    if isinstance(image, bytes):
+        # Caller already encoded the square; don't pay the deflate twice.
+        png = image
+    else:
+        # Encode on a worker thread so the event loop keeps dispatching
+        # requests; level 1 is plenty for an upload the API re-decodes anyway.
+        png = await asyncio.to_thread(image_to_png, image, 1)
 
-    response = await openai.Image.acreate_edit(
-        image=png,
-        mask=png,
-        prompt=prompt,
-        n=1,
-        size=f"{square_size[0]}x{square_size[1]}",
-    )
-    image_url = response["data"][0]["url"]
+    async def edit(api: "openai.AsyncOpenAI") -> Any:
+        return await api.images.edit(
+            image=("square.png", png),
+            mask=("square.png", png),
+            prompt=prompt,
+            n=1,
+            size=f"{square_size[0]}x{square_size[1]}",
+        )
+
+    if oai is not None:
+        response = await edit(oai)
+    else:
+        async with openai.AsyncOpenAI(api_key=openai_api_key, max_retries=0) as own_oai:
+            response = await edit(own_oai)
+    image_url = response.data[0].url
+
+    async def download(http: httpx.AsyncClient) -> io.BytesIO:
+        # Stream chunks straight into one buffer instead of materializing the
+        # whole body as bytes first and copying it into BytesIO afterwards.
+        buffer = io.BytesIO()
+        async with http.stream("GET", image_url) as response:
+            async for chunk in response.aiter_bytes():
+                buffer.write(chunk)
+        buffer.seek(0)
+        return buffer
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(image_url)
+    if client is not None:
+        buffer = await download(client)
+    else:
+        async with httpx.AsyncClient() as own_client:
+            buffer = await download(own_client)
 
-    return Image.open(io.BytesIO(response.content))
+    inpainted = Image.open(buffer)
+    inpainted.load()
+    return inpainted
@@ -1,9 +1,130 @@
 # Helper function to convert Image to png
 
+import asyncio
 import io
+import json
+import logging
+import random
+import re
+import time
 from PIL import Image
 
-def image_to_png(image: Image.Image) -> bytes:
-    png = io.BytesIO()
-    image.save(png, format="PNG")
-    return png.getvalue()
\ No newline at end of file
+try:
+    import pyvips
+except ImportError:  # pragma: no cover - optional accelerator
+    pyvips = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+def image_to_png(
+    image: Image.Image, compress_level: int = 6, buf: io.BytesIO = None
+) -> bytes:
+    if pyvips is not None:
+        # libvips encodes noticeably faster than PIL at comparable levels;
+        # the result only needs to be a valid PNG, not a small one.
+        vips_image = pyvips.Image.new_from_memory(
+            image.tobytes(), image.width, image.height, len(image.getbands()), "uchar"
+        )
+        return bytes(vips_image.pngsave_buffer(compression=compress_level, filter="none"))
+    # Callers in a loop can pass their own buffer to recycle one allocation
+    # across squares; getvalue() still copies, but the backing store does not
+    # get reallocated and regrown every call.
+    if buf is None:
+        buf = io.BytesIO()
+    else:
+        buf.seek(0)
+        buf.truncate()
+    image.save(buf, format="PNG", compress_level=compress_level)
+    return buf.getvalue()
+
+
+def box_intersects_any(box, boxes) -> bool:
+    """
+    Tests whether an [x0, y0, x1, y1] box intersects any row of an (N, 4)
+    int array of boxes. Vectorized NumPy stands in for the compiled kernel
+    this would be in an extension module; box counts here never warrant one.
+    """
+    if not boxes.size:
+        return False
+    x0, y0, x1, y1 = box
+    return bool(
+        ((x0 < boxes[:, 2]) & (x1 > boxes[:, 0]) & (y0 < boxes[:, 3]) & (y1 > boxes[:, 1])).any()
+    )
+
+
+def extract_json(text: str):
+    """
+    Parses a JSON object out of LLM output that may wrap it in Markdown
+    fences or surrounding prose. Tries the raw text, then the fence-stripped
+    text, then the first {...} block; returns None when nothing parses.
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    stripped = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.MULTILINE)
+    candidates = [text, stripped]
+    match = re.search(r"\{.*\}", stripped, re.DOTALL)
+    if match:
+        candidates.append(match.group(0))
+    for candidate in candidates:
+        try:
+            return loads(candidate)
+        except ValueError:
+            # Both json.JSONDecodeError and orjson.JSONDecodeError are
+            # ValueError subclasses.
+            continue
+    return None
+
+
+class RateLimiter:
+    """
+    A token-bucket throttle that spaces requests pro-actively instead of
+    waiting for the server to answer 429. Capacity refills continuously at
+    `requests_per_minute`; `acquire` sleeps until one request's worth of
+    budget is available.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self._available = float(requests_per_minute)
+        self._last_refill = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._available = min(
+                self.requests_per_minute,
+                self._available + (now - self._last_refill) * self.requests_per_minute / 60.0,
+            )
+            self._last_refill = now
+            if self._available >= 1.0:
+                self._available -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._available) * 60.0 / self.requests_per_minute)
+
+
+async def retry_async(coro_factory, tries: int = 5, delay: float = 1.0, exceptions=(Exception,)):
+    """
+    Awaits `coro_factory()` up to `tries` times, sleeping with jittered
+    exponential backoff between attempts. Re-raises the last exception when
+    all attempts fail.
+    """
+    for attempt in range(tries):
+        try:
+            return await coro_factory()
+        except exceptions as error:
+            if attempt == tries - 1:
+                raise
+            logging.warning(f"Retrying after error ({attempt + 1}/{tries}): {error}")
+            await asyncio.sleep(delay + random.random())
+            delay *= 2
+
+
+def canvas_to_image(canvas) -> Image.Image:
+    """
+    Wraps an (H, W, 4) contiguous RGBA uint8 NumPy canvas as a PIL image
+    without copying the pixel buffer, via Image.frombuffer + memoryview.
+    """
+    height, width = canvas.shape[:2]
+    return Image.frombuffer("RGBA", (width, height), memoryview(canvas), "raw", "RGBA", 0, 1)
\ No newline at end of file
@@ -1,10 +1,58 @@
 """
-    Dummy conftest.py for multinpainter.
+    Shared pytest configuration for multinpainter.
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    - https://docs.pytest.org/en/stable/fixture.html
-    - https://docs.pytest.org/en/stable/writing_plugins.html
+    On CI runners whose default temp directory is disk-backed (macOS, some
+    containers), point PYTEST_BASETEMP at a tmpfs/ramdisk path (e.g.
+    /dev/shm/pytest) so the per-test PNG writes never hit persistent
+    storage. An explicit --basetemp on the command line still wins.
+    Feeding images purely from BytesIO is not an option here:
+    Multinpainter_OpenAI takes a filesystem path, not a file-like object.
 """
 
-# import pytest
+import functools
+import os
+from pathlib import Path
+
+import pytest
+
+_FAKE_CAPTION = "a red square"
+
+
+@functools.lru_cache(maxsize=4)
+def _fake_square(size):
+    """
+    The canned green square the fake inpainter returns, built once per
+    size rather than reallocated for every inpainted square. Callers paste
+    it without mutating it, so sharing one instance is safe.
+    """
+    from PIL import Image
+
+    return Image.new("RGBA", size, (0, 255, 0, 255))
+
+
+def pytest_configure(config):
+    basetemp = os.environ.get("PYTEST_BASETEMP")
+    if basetemp and config.option.basetemp is None:
+        config.option.basetemp = Path(basetemp)
+
+
+@pytest.fixture(autouse=True)
+def _mock_external(monkeypatch):
+    """
+    Replaces the two network-bound model functions with in-process fakes
+    once per test via monkeypatch, instead of each test opening its own
+    patch() context. Also guarantees no test can reach OpenAI or
+    Huggingface by accident. The painter resolves both functions from
+    multinpainter.models at call time, so swapping the module attributes
+    is sufficient.
+    """
+    import multinpainter.models as models
+
+    async def fake_inpaint(png, prompt, size, openai_api_key=None, **kwargs):
+        return _fake_square(size)
+
+    async def fake_describe(image, prompt_model, hf_api_key=None, **kwargs):
+        return _FAKE_CAPTION
+
+    monkeypatch.setattr(models, "inpaint_square_openai", fake_inpaint)
+    monkeypatch.setattr(models, "describe_image_hf", fake_describe)
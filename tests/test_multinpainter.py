@@ -0,0 +1,230 @@
+import functools
+
+import pytest
+
+from multinpainter import Multinpainter_OpenAI, __version__
+from multinpainter.__main__ import (
+    cli,
+    describe,
+    describe_async,
+    get_inpainter,
+    inpaint,
+    inpaint_async,
+)
+
+__author__ = "Adam Twardoch"
+__license__ = "Apache-2.0"
+
+
+@functools.lru_cache(maxsize=1)
+def _red_png_bytes():
+    """
+    The 512x512 red input image, PNG-encoded once per process on first use.
+    The lazy io/PIL imports only keep those names out of the module
+    namespace - Pillow is already loaded transitively by the multinpainter
+    import above. The caching is what matters: the PNG is encoded once,
+    not per test.
+    """
+    import io
+
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (512, 512), "red").save(buf, "PNG", compress_level=1)
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="session")
+def red_png(tmp_path_factory):
+    """
+    Path to the shared red input image, written once per test session.
+    """
+    path = tmp_path_factory.mktemp("img") / "red.png"
+    path.write_bytes(_red_png_bytes())
+    return str(path)
+
+
+@pytest.fixture
+def mock_painter():
+    """
+    A painter stand-in with awaitable inpaint/describe_image, built once
+    per test and shared by the CLI tests. unittest.mock is imported here,
+    not at module top, so the version/export tests skip it.
+    """
+    from unittest.mock import AsyncMock, Mock
+
+    painter = Mock()
+    painter.inpaint = AsyncMock()
+    painter.describe_image = AsyncMock()
+    return painter
+
+
+class TestMultinpainterOpenAI:
+    @pytest.mark.parametrize(
+        "kwargs,expected",
+        [
+            (
+                {},
+                {
+                    "square": 1024,
+                    "step": 512,
+                    "humans": True,
+                    "verbose": False,
+                    "input_width": 512,
+                    "input_height": 512,
+                },
+            ),
+            (
+                {
+                    "prompt": "test prompt",
+                    "square": 512,
+                    "step": 256,
+                    "humans": False,
+                    "verbose": True,
+                    "hf_api_key": "test_hf_key",
+                },
+                {
+                    "prompt": "test prompt",
+                    "square": 512,
+                    "step": 256,
+                    "humans": False,
+                    "verbose": True,
+                },
+            ),
+        ],
+    )
+    def test_init(self, red_png, tmp_path, kwargs, expected):
+        painter = Multinpainter_OpenAI(
+            image_path=red_png,
+            out_path=str(tmp_path / "out.png"),
+            out_width=1024,
+            out_height=1024,
+            openai_api_key="test_key",
+            **kwargs,
+        )
+        for attribute, value in expected.items():
+            assert getattr(painter, attribute) == value
+
+    def test_invalid_square_size(self):
+        # Validation runs before the image is opened, so no real file and
+        # no PNG encode are needed to trigger it.
+        with pytest.raises(ValueError):
+            Multinpainter_OpenAI(
+                image_path="/nonexistent.png",
+                out_path="out.png",
+                out_width=1024,
+                out_height=1024,
+                square=100,
+                openai_api_key="test_key",
+            )
+
+    async def test_gpt_fallback_used(self, red_png, tmp_path, monkeypatch):
+        # The fallback prompt GPT derives during prep must reach the
+        # squares without humans, not be overwritten by the main prompt.
+        import types
+
+        painter = Multinpainter_OpenAI(
+            image_path=red_png,
+            out_path=str(tmp_path / "out.png"),
+            out_width=1024,
+            out_height=1024,
+            prompt="a man on a beach",
+            square=512,
+            humans=True,
+            openai_api_key="test_key",
+        )
+        monkeypatch.setattr(painter, "detect_faces", lambda: None)
+        monkeypatch.setattr(painter, "detect_humans", lambda: [(0, 0, 64, 64)])
+
+        async def fake_chat(**kwargs):
+            message = types.SimpleNamespace(content='{"approved": ["beach", "sunny"]}')
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+        fake_client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=fake_chat))
+        )
+        monkeypatch.setattr(painter, "get_openai_client", lambda: fake_client)
+
+        import multinpainter.models as models
+
+        prompts = []
+
+        async def recording_inpaint(png, prompt, size, openai_api_key=None, **kwargs):
+            prompts.append(prompt)
+            from PIL import Image
+
+            return Image.new("RGBA", size, (0, 255, 0, 255))
+
+        monkeypatch.setattr(models, "inpaint_square_openai", recording_inpaint)
+
+        await painter.inpaint()
+
+        assert painter.prompt_fallback == "beach, sunny, no humans"
+        # Squares overlapping the human box keep the main prompt; the rest
+        # must get the GPT-derived fallback.
+        assert "a man on a beach" in prompts
+        assert "beach, sunny, no humans" in prompts
+
+    async def test_inpaint_mock(self, red_png, tmp_path):
+        out_path = tmp_path / "out.png"
+        painter = Multinpainter_OpenAI(
+            image_path=red_png,
+            out_path=str(out_path),
+            out_width=1024,
+            out_height=1024,
+            prompt="test prompt",
+            fallback="test fallback",
+            square=512,
+            humans=False,
+            openai_api_key="test_key",
+        )
+        await painter.inpaint()
+
+        from PIL import Image
+
+        out = Image.open(out_path)
+        assert out.size == (1024, 1024)
+
+
+class TestCLIFunctions:
+    def test_get_inpainter(self, red_png, tmp_path):
+        painter = get_inpainter(
+            image_path=red_png,
+            out_path=str(tmp_path / "out.png"),
+            out_width=1024,
+            out_height=1024,
+            openai_api_key="test_key",
+        )
+        assert isinstance(painter, Multinpainter_OpenAI)
+
+    async def test_inpaint_function(self, mock_painter, monkeypatch, tmp_path):
+        monkeypatch.setattr(
+            "multinpainter.__main__.get_inpainter", lambda **kwargs: mock_painter
+        )
+        out_path = str(tmp_path / "out.png")
+        mock_painter.out_path = out_path
+        result = await inpaint_async(
+            image_path="in.png",
+            out_path=out_path,
+            out_width=1024,
+            out_height=1024,
+            prompt="test prompt",
+        )
+        assert result == out_path
+        mock_painter.inpaint.assert_awaited_once()
+
+    async def test_describe_function(self, mock_painter, monkeypatch):
+        monkeypatch.setattr(
+            "multinpainter.__main__.get_inpainter", lambda **kwargs: mock_painter
+        )
+        mock_painter.prompt = "a red square"
+        result = await describe_async(image_path="in.png")
+        assert result == "a red square"
+        mock_painter.describe_image.assert_awaited_once()
+
+
+def test_public_api():
+    for obj in (Multinpainter_OpenAI, inpaint, describe, cli):
+        assert callable(obj)
+    assert isinstance(__version__, str)
+    assert __version__ != "unknown"